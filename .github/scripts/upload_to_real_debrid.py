@@ -7,21 +7,37 @@ Automatically uploads magnet links to Real-Debrid using their API
 import os
 import sys
 import json
+import heapq
+import random
 import requests
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
 from pathlib import Path
 from datetime import datetime, timedelta
+from requests.adapters import HTTPAdapter
 
-def setup_logging():
-    """Setup logging for Real-Debrid upload"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
-    return logging.getLogger(__name__)
+# Configure logging once at import time; calling basicConfig repeatedly is
+# a no-op that still takes the logging lock, and reusing one logger avoids
+# duplicate-handler surprises when this module is imported elsewhere
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
 
 class RealDebridUploader:
+    # Statuses worth retrying: timeouts, rate limits and transient 5xx.
+    # Other 4xx errors (bad auth, bad magnet, ...) won't improve on retry.
+    RETRYABLE_STATUSES = (408, 429, 500, 502, 503, 504)
+    RECOVERABLE_EXCEPTIONS = (
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
     def __init__(self, api_key):
         self.api_key = api_key
         self.base_url = "https://api.real-debrid.com/rest/1.0"
@@ -29,52 +45,127 @@ class RealDebridUploader:
             "Authorization": f"Bearer {api_key}",
             "User-Agent": "YTS-Scraper-GitHub-Actions/1.0"
         }
-        self.logger = setup_logging()
-        
+        self.logger = logger
+
+        # Reuse one pooled connection for every API call (keep-alive avoids
+        # a TCP+TLS handshake per request)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
         # Rate limiting configuration
-        self.rate_limit_delay = 2.0  # Seconds between requests
         self.max_retries = 3
         self.retry_delay = 10  # Seconds to wait before retry
         self.backoff_delay = 60  # Seconds to wait when hitting rate limits
+        self.max_backoff = float(os.environ.get('MAX_BACKOFF_SECONDS', '300'))  # Ceiling for a single backoff sleep
         self.max_concurrent_downloads = 10  # Limit active downloads
-        
+
+        # Adaptive token bucket: the send rate creeps up while the API is
+        # happy and halves whenever it reports congestion, so throughput
+        # converges on whatever the server actually accepts
+        self.token_rate = 0.5  # Requests per second
+        self.min_token_rate = 0.1
+        self.max_token_rate = 2.0
+        self.token_rate_step = 0.2
+        self.token_capacity = 2.0
+        self.tokens = self.token_capacity
+        self.last_refill_time = time.monotonic()
+
         # Track upload state
-        self.last_request_time = 0
         self.consecutive_rate_limits = 0
-        self.active_downloads = 0
-    
+
+        # Cached result of the (expensive) full torrent listing; local
+        # increments on upload keep the count roughly current between
+        # refreshes
+        self._active_count_cache = None
+        self._active_count_time = 0.0
+        self._active_count_ttl = 30.0
+
+        # Serializes rate-limit bookkeeping when uploads run on worker threads
+        self._rate_lock = threading.Lock()
+
     def _wait_for_rate_limit(self):
-        """Implement rate limiting between requests"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.rate_limit_delay:
-            wait_time = self.rate_limit_delay - time_since_last
+        """Take a token from the adaptive bucket, waiting for a refill if empty"""
+        while True:
+            with self._rate_lock:
+                now = time.monotonic()
+                self.tokens = min(self.token_capacity,
+                                  self.tokens + (now - self.last_refill_time) * self.token_rate)
+                self.last_refill_time = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait_time = (1 - self.tokens) / self.token_rate
+
             self.logger.debug(f"⏱️  Rate limiting: waiting {wait_time:.1f}s")
             time.sleep(wait_time)
-        
-        self.last_request_time = time.time()
+
+    def _reward_request_success(self):
+        """Creep the send rate back up after a successful response"""
+        with self._rate_lock:
+            self.token_rate = min(self.max_token_rate, self.token_rate + self.token_rate_step)
+
+    def upload_and_select(self, magnet_link, movie_info):
+        """Upload a magnet link and chain the file selection in one task"""
+        result = self.upload_magnet_link(magnet_link, movie_info)
+        if result['success']:
+            self.select_files(result['id'])
+        return result
     
     def _handle_rate_limit_error(self, error_code):
-        """Handle rate limit errors with exponential backoff"""
-        self.consecutive_rate_limits += 1
-        
+        """Penalize the send rate when the API reports congestion"""
+        with self._rate_lock:
+            self.consecutive_rate_limits += 1
+            self.token_rate = max(self.min_token_rate, self.token_rate * 0.5)
+            self.tokens = 0.0
+            self.last_refill_time = time.monotonic()
+
         if error_code == 34:  # too_many_requests
-            wait_time = self.backoff_delay * (2 ** min(self.consecutive_rate_limits - 1, 3))
-            self.logger.warning(f"⏳ Rate limit hit. Waiting {wait_time}s before continuing...")
-            time.sleep(wait_time)
+            self.logger.warning(f"⏳ Rate limit hit. Reducing request rate to {self.token_rate:.2f}/s")
         elif error_code == 21:  # too_many_active_downloads
-            wait_time = self.backoff_delay * 2
-            self.logger.warning(f"⏳ Too many active downloads. Waiting {wait_time}s for some to complete...")
-            time.sleep(wait_time)
+            self.logger.warning(f"⏳ Too many active downloads. Reducing request rate to {self.token_rate:.2f}/s")
+
+    def _retry_after_seconds(self, response):
+        """Read the server's Retry-After header, in seconds, if it sent one"""
+        retry_after = response.headers.get('Retry-After')
+        if not retry_after:
+            return None
+
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+
+        # Retry-After may also be an HTTP-date
+        try:
+            retry_date = parsedate_to_datetime(retry_after)
+            return (retry_date - datetime.now(retry_date.tzinfo)).total_seconds()
+        except (TypeError, ValueError):
+            return None
+
+    def _sleep_before_retry(self, response):
+        """Wait as long as the server asks, guessing a backoff only as a fallback"""
+        wait_time = self._retry_after_seconds(response)
+
+        if wait_time is None or wait_time < 0:
+            # Jitter spreads out concurrent runs so they don't all retry at once
+            base = self.backoff_delay * (2 ** min(self.consecutive_rate_limits - 1, 3))
+            wait_time = min(base * (1 + random.random() * 0.5), self.max_backoff)
+            self.logger.warning(f"⏳ No Retry-After header. Backing off for {wait_time:.0f}s...")
+        else:
+            wait_time = min(wait_time, self.max_backoff)
+            self.logger.warning(f"⏳ Server asked to retry after {wait_time:.0f}s. Waiting...")
+
+        time.sleep(wait_time)
     
     def test_api_connection(self):
         """Test if the API key is valid"""
         try:
             self._wait_for_rate_limit()
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/user",
-                headers=self.headers,
                 timeout=10
             )
             if response.status_code == 200:
@@ -100,9 +191,8 @@ class RealDebridUploader:
                 
                 data = {'magnet': magnet_link}
                 
-                response = requests.post(
+                response = self.session.post(
                     f"{self.base_url}/torrents/addMagnet",
-                    headers=self.headers,
                     data=data,
                     timeout=30
                 )
@@ -112,31 +202,48 @@ class RealDebridUploader:
                     torrent_id = result.get('id')
                     uri = result.get('uri')
                     self.logger.info(f"✅ Uploaded: {movie_name} ({quality}) (ID: {torrent_id})")
+                    self._reward_request_success()
                     self.consecutive_rate_limits = 0  # Reset counter on success
-                    self.active_downloads += 1
+                    with self._rate_lock:
+                        # Keep the cached active count roughly current so
+                        # the dispatch throttle sees this new torrent
+                        if self._active_count_cache is not None:
+                            self._active_count_cache += 1
                     return {'success': True, 'id': torrent_id, 'uri': uri}
                 else:
+                    # Read the body once; response.text would re-decode it
+                    # on every access
+                    raw = response.content
                     try:
-                        error_data = response.json()
-                        error_code = error_data.get('error_code')
-                        error_msg = error_data.get('error', response.text)
-                        
-                        # Handle specific error codes
-                        if error_code in [34, 21]:  # Rate limit or too many downloads
-                            self._handle_rate_limit_error(error_code)
-                            if attempt < self.max_retries - 1:
-                                self.logger.info(f"🔄 Retrying {movie_name} (attempt {attempt + 2}/{self.max_retries})")
-                                continue
-                        
-                        self.logger.error(f"❌ Failed to upload {movie_name}: {error_msg}")
-                        return {'success': False, 'error': error_msg, 'error_code': error_code}
-                        
+                        error_data = json.loads(raw)
                     except json.JSONDecodeError:
-                        error_msg = response.text
+                        error_data = None
+
+                    if error_data is None:
+                        error_msg = raw.decode('utf-8', 'replace')
                         self.logger.error(f"❌ Failed to upload {movie_name}: {error_msg}")
                         return {'success': False, 'error': error_msg}
-                        
-            except Exception as e:
+
+                    error_code = error_data.get('error_code')
+                    error_msg = error_data.get('error') or raw.decode('utf-8', 'replace')
+
+                    # Handle specific error codes
+                    if response.status_code == 429 or error_code in [34, 21]:  # Rate limit or too many downloads
+                        self._handle_rate_limit_error(error_code)
+                        if attempt < self.max_retries - 1:
+                            self._sleep_before_retry(response)
+                            self.logger.info(f"🔄 Retrying {movie_name} (attempt {attempt + 2}/{self.max_retries})")
+                            continue
+                    elif response.status_code in self.RETRYABLE_STATUSES:
+                        if attempt < self.max_retries - 1:
+                            self.logger.warning(f"⚠️  Server error {response.status_code} for {movie_name} (attempt {attempt + 1})")
+                            time.sleep(self.retry_delay)
+                            continue
+
+                    self.logger.error(f"❌ Failed to upload {movie_name}: {error_msg}")
+                    return {'success': False, 'error': error_msg, 'error_code': error_code}
+
+            except self.RECOVERABLE_EXCEPTIONS as e:
                 if attempt < self.max_retries - 1:
                     self.logger.warning(f"⚠️  Error uploading {movie_name} (attempt {attempt + 1}): {e}")
                     time.sleep(self.retry_delay)
@@ -144,6 +251,11 @@ class RealDebridUploader:
                 else:
                     self.logger.error(f"❌ Error uploading {movie_name}: {e}")
                     return {'success': False, 'error': str(e)}
+            except Exception as e:
+                # Unrecoverable: retrying the same request would fail the
+                # same way, so don't burn max_retries * retry_delay on it
+                self.logger.error(f"❌ Unrecoverable error uploading {movie_name}: {e}")
+                return {'success': False, 'error': str(e)}
         
         return {'success': False, 'error': 'Max retries exceeded'}
     
@@ -151,9 +263,8 @@ class RealDebridUploader:
         """Get information about an uploaded torrent"""
         try:
             self._wait_for_rate_limit()
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/torrents/info/{torrent_id}",
-                headers=self.headers,
                 timeout=10
             )
             if response.status_code == 200:
@@ -166,49 +277,50 @@ class RealDebridUploader:
     def select_files(self, torrent_id):
         """Select all files in a torrent for download"""
         try:
-            # First get torrent info to see available files
-            torrent_info = self.get_torrent_info(torrent_id)
-            if not torrent_info:
+            # The API accepts the 'all' shorthand, so there is no need to
+            # fetch the torrent info just to enumerate file IDs
+            self._wait_for_rate_limit()
+            response = self.session.post(
+                f"{self.base_url}/torrents/selectFiles/{torrent_id}",
+                data={'files': 'all'},
+                timeout=10
+            )
+
+            if response.status_code == 204:
+                self.logger.info(f"📁 Selected all files for torrent {torrent_id}")
+                return True
+            elif response.status_code == 202:
+                # "Action already done" — Real-Debrid auto-selects when the
+                # torrent has a single file, the common case for movies
+                self.logger.debug(f"📁 Files already selected for torrent {torrent_id}")
+                return True
+            else:
+                self.logger.error(f"Failed to select files for torrent {torrent_id}")
                 return False
-            
-            # Select all files
-            files = torrent_info.get('files', [])
-            if files:
-                file_ids = [str(f['id']) for f in files]
-                data = {'files': ','.join(file_ids)}
-                
-                self._wait_for_rate_limit()
-                response = requests.post(
-                    f"{self.base_url}/torrents/selectFiles/{torrent_id}",
-                    headers=self.headers,
-                    data=data,
-                    timeout=10
-                )
-                
-                if response.status_code == 204:
-                    self.logger.info(f"📁 Selected {len(file_ids)} files for torrent {torrent_id}")
-                    return True
-                else:
-                    self.logger.error(f"Failed to select files for torrent {torrent_id}")
-                    return False
-            return True
-            
+
         except Exception as e:
             self.logger.error(f"Error selecting files: {e}")
             return False
     
     def get_active_downloads_count(self):
         """Check how many downloads are currently active"""
+        # Serve from cache while fresh — listing every torrent on the
+        # account is a heavy call to repeat on each pause check
+        if (self._active_count_cache is not None
+                and time.time() - self._active_count_time < self._active_count_ttl):
+            return self._active_count_cache
+
         try:
             self._wait_for_rate_limit()
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/torrents",
-                headers=self.headers,
                 timeout=10
             )
             if response.status_code == 200:
                 torrents = response.json()
                 active_count = sum(1 for t in torrents if t.get('status') in ['downloading', 'queued'])
+                self._active_count_cache = active_count
+                self._active_count_time = time.time()
                 return active_count
             return 0
         except Exception as e:
@@ -216,13 +328,22 @@ class RealDebridUploader:
             return 0
 
 def find_magnet_files(directory):
-    """Find all .magnet files in the directory"""
-    magnet_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.magnet'):
-                magnet_files.append(os.path.join(root, file))
-    return magnet_files
+    """Yield (path, mtime) for every .magnet file under the directory"""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.magnet'):
+                        # DirEntry caches the stat result, so sorting by
+                        # mtime later costs no extra syscalls; Path objects
+                        # give callers .name without re-splitting the string
+                        yield Path(entry.path), entry.stat().st_mtime
+        except OSError as e:
+            print(f"Error scanning {current}: {e}")
 
 def load_magnet_info(magnet_file_path):
     """Load magnet link information from file"""
@@ -235,8 +356,6 @@ def load_magnet_info(magnet_file_path):
 
 def main():
     """Main function with smart batching and rate limiting"""
-    logger = setup_logging()
-    
     # Get environment variables
     api_key = os.environ.get('REAL_DEBRID_API_KEY')
     magnet_dir = os.environ.get('TORRENT_DIR', 'Downloads/2160p_Movies')
@@ -266,69 +385,94 @@ def main():
     active_downloads = uploader.get_active_downloads_count()
     logger.info(f"📊 Current active downloads: {active_downloads}")
     
-    # Find magnet files
-    magnet_files = find_magnet_files(magnet_dir)
-    
-    if not magnet_files:
+    # Find magnet files along with their modification times
+    magnet_entries = list(find_magnet_files(magnet_dir))
+
+    if not magnet_entries:
         logger.info("📭 No .magnet files found to upload")
         return
-    
-    # Sort by newest first (based on file modification time)
-    magnet_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-    
-    # Limit the number of uploads per run to avoid overwhelming Real-Debrid
-    if len(magnet_files) > max_uploads_per_run:
-        logger.info(f"🔍 Found {len(magnet_files)} magnet links, limiting to {max_uploads_per_run} uploads per run")
-        magnet_files = magnet_files[:max_uploads_per_run]
+
+    # Keep only the newest files, up to the per-run upload limit; nlargest
+    # is O(N log K) and returns them already sorted newest first
+    if len(magnet_entries) > max_uploads_per_run:
+        logger.info(f"🔍 Found {len(magnet_entries)} magnet links, limiting to {max_uploads_per_run} uploads per run")
+        magnet_entries = heapq.nlargest(max_uploads_per_run, magnet_entries, key=lambda entry: entry[1])
     else:
-        logger.info(f"🔍 Found {len(magnet_files)} magnet links to upload")
+        logger.info(f"🔍 Found {len(magnet_entries)} magnet links to upload")
+        magnet_entries.sort(key=lambda entry: entry[1], reverse=True)
+
+    magnet_files = [path for path, _ in magnet_entries]
     
-    # Upload magnet links with smart rate limiting
+    # Upload magnet links concurrently with smart rate limiting
+    max_concurrent_uploads = int(os.environ.get('MAX_CONCURRENT_UPLOADS', '5'))
     successful_uploads = 0
     failed_uploads = 0
     skipped_uploads = 0
-    
-    for i, magnet_file in enumerate(magnet_files, 1):
-        # Check if we should pause due to too many active downloads
-        if uploader.active_downloads >= uploader.max_concurrent_downloads:
-            logger.info(f"⏸️  Pausing uploads - too many active downloads ({uploader.active_downloads})")
-            time.sleep(30)  # Wait for some downloads to complete
-            uploader.active_downloads = uploader.get_active_downloads_count()
-        
-        magnet_info = load_magnet_info(magnet_file)
+
+    # Parse magnet files up front so worker tasks only do network I/O; a
+    # small thread pool overlaps the disk reads instead of serializing them
+    with ThreadPoolExecutor(max_workers=4) as loader:
+        magnet_infos = list(loader.map(load_magnet_info, magnet_files))
+
+    upload_queue = []
+    for magnet_file, magnet_info in zip(magnet_files, magnet_infos):
         if not magnet_info:
             failed_uploads += 1
             continue
-            
+
         magnet_link = magnet_info.get('magnet_link')
         if not magnet_link:
-            logger.error(f"❌ No magnet link found in {os.path.basename(magnet_file)}")
+            logger.error(f"❌ No magnet link found in {magnet_file.name}")
             failed_uploads += 1
             continue
-        
-        movie_name = magnet_info.get('movie_name', 'Unknown')
-        quality = magnet_info.get('quality', 'Unknown')
-        
-        logger.info(f"📤 Uploading ({i}/{len(magnet_files)}): {movie_name} ({quality})")
-        result = uploader.upload_magnet_link(magnet_link, magnet_info)
-        
-        if result['success']:
-            successful_uploads += 1
-            # Auto-select files for download
-            torrent_id = result['id']
-            uploader.select_files(torrent_id)
-        else:
-            # Check if we should skip remaining uploads due to persistent errors
-            error_code = result.get('error_code')
-            if error_code in [21, 34] and uploader.consecutive_rate_limits >= 3:
-                logger.warning(f"⏸️  Too many consecutive rate limit errors. Skipping remaining {len(magnet_files) - i} uploads.")
-                skipped_uploads = len(magnet_files) - i
-                break
-            failed_uploads += 1
-        
-        # Progress update every 10 uploads
-        if i % 10 == 0:
-            logger.info(f"📊 Progress: {i}/{len(magnet_files)} processed, {successful_uploads} successful, {failed_uploads} failed")
+
+        upload_queue.append((magnet_link, magnet_info))
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_uploads) as executor:
+        futures = {}
+        for magnet_link, magnet_info in upload_queue:
+            # Hold new dispatches while the account is at its active-
+            # download limit; the cached count keeps rechecks cheap
+            while uploader.get_active_downloads_count() >= uploader.max_concurrent_downloads:
+                logger.info(f"⏸️  Max concurrent downloads reached ({uploader.max_concurrent_downloads}). Waiting 30 seconds...")
+                time.sleep(30)
+            futures[executor.submit(uploader.upload_and_select, magnet_link, magnet_info)] = magnet_info
+
+        pending = set(futures)
+        breaker_tripped = False
+        for i, future in enumerate(as_completed(futures), 1):
+            pending.discard(future)
+            result = future.result()
+
+            if result['success']:
+                successful_uploads += 1
+            else:
+                failed_uploads += 1
+                # Stop dispatching new uploads when rate limit errors persist
+                error_code = result.get('error_code')
+                if error_code in [21, 34] and uploader.consecutive_rate_limits >= 3:
+                    cancelled = sum(1 for f in futures if f.cancel())
+                    if cancelled:
+                        logger.warning(f"⏸️  Too many consecutive rate limit errors. Skipping remaining {cancelled} uploads.")
+                        skipped_uploads = cancelled
+                    breaker_tripped = True
+                    break
+
+            # Progress update every 10 uploads
+            if i % 10 == 0:
+                logger.info(f"📊 Progress: {i}/{len(upload_queue)} processed, {successful_uploads} successful, {failed_uploads} failed")
+
+        if breaker_tripped:
+            # cancel() can't stop workers already running; collect their
+            # results during shutdown so the summary reflects them
+            for future in pending:
+                if future.cancelled():
+                    continue
+                result = future.result()
+                if result['success']:
+                    successful_uploads += 1
+                else:
+                    failed_uploads += 1
     
     # Summary
     total_processed = successful_uploads + failed_uploads
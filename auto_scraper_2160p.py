@@ -8,6 +8,7 @@ import os
 import sys
 import subprocess
 import logging
+import types
 from datetime import datetime
 
 # Add the project directory to Python path
@@ -33,51 +34,55 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
+def count_torrent_files(root):
+    """Count .torrent files under a directory without building per-dir lists"""
+    total = 0
+    stack = [root]
+    while stack:
+        current = stack.pop()
+        with os.scandir(current) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.torrent'):
+                    total += 1
+    return total
+
+# Scraper arguments for 2160p runs. The values are constants, so the
+# namespace is built once at import time instead of re-allocating an Args
+# object per invocation — and it's trivially introspectable in tests
+_ARGS_2160P = types.SimpleNamespace(
+    # Output directory for 2160p movies
+    output='Downloads/2160p_Movies',
+    # 4K/UHD quality
+    quality='2160p',
+    # Get all genres for maximum coverage
+    genre='all',
+    # All ratings (no minimum restriction)
+    rating='0',
+    # Sort by rating to get the full catalog, not just the latest movies
+    sort_by='rating',
+    # Categorization - now using movie name and year organization
+    categorize_by='none',
+    # All years (no year restriction)
+    year_limit=0,
+    # Start from page 1
+    page=1,
+    # Download movie posters for better organization
+    background=True,
+    # Include IMDb ID in filename for Real-Debrid compatibility
+    imdb_id=True,
+    # Multiprocessing is faster but risks being blocked; keep it off
+    multiprocess=False,
+    # Don't use CSV only mode - we want the torrent files
+    csv_only=False,
+    # Auto-continue when finding existing files (for automated environments)
+    auto_continue=True,
+)
+
 def create_args_for_2160p():
-    """Create optimized arguments for 2160p movie scraping"""
-    class Args:
-        def __init__(self):
-            # Output directory for 2160p movies
-            self.output = 'Downloads/2160p_Movies'
-            
-            # Quality settings
-            self.quality = '2160p'  # 4K/UHD quality
-            
-            # Genre settings - get all genres for maximum coverage
-            self.genre = 'all'
-            
-            # Rating settings - all ratings (no minimum restriction)
-            self.rating = '0'
-            
-            # Sort by rating to get highest quality movies first, then by date
-            # This ensures we get all movies, not just latest
-            self.sort_by = 'rating'  # Changed from 'latest' to get full catalog
-            
-            # Categorization - now using movie name and year organization
-            self.categorize_by = 'none'
-            
-            # All years (no year restriction)
-            self.year_limit = 0
-            
-            # Start from page 1
-            self.page = 1
-            
-            # Download movie posters for better organization
-            self.background = True
-            
-            # Include IMDb ID in filename for Real-Debrid compatibility
-            self.imdb_id = True
-            
-            # Use multiprocessing for faster downloads (be careful with rate limits)
-            self.multiprocess = False  # Set to False to avoid being blocked
-            
-            # Don't use CSV only mode - we want the torrent files
-            self.csv_only = False
-            
-            # Auto-continue when finding existing files (for automated environments)
-            self.auto_continue = True
-    
-    return Args()
+    """Return the precomputed arguments for 2160p movie scraping"""
+    return _ARGS_2160P
 
 def run_scraper():
     """Run the YTS scraper with 2160p settings"""
@@ -108,8 +113,7 @@ def run_scraper():
         # Log statistics
         output_dir = os.path.join(os.getcwd(), args.output)
         if os.path.exists(output_dir):
-            torrent_count = sum(len([f for f in files if f.endswith('.torrent')]) 
-                              for _, _, files in os.walk(output_dir))
+            torrent_count = count_torrent_files(output_dir)
             logger.info(f"Total .torrent files in output directory: {torrent_count}")
         
     except KeyboardInterrupt:
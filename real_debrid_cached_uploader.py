@@ -7,11 +7,27 @@ Only uploads torrents that are already cached on Real-Debrid for instant availab
 import os
 import sys
 import json
+import re
 import requests
 import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# orjson parses the small JSON documents this script churns through a few
+# times faster than the stdlib; fall back transparently when not installed
+try:
+    import orjson
+
+    def _loads(data):
+        return orjson.loads(data)
+except ImportError:
+    def _loads(data):
+        return json.loads(data)
 
 def setup_logging():
     """Setup logging for Real-Debrid cached upload"""
@@ -22,6 +38,10 @@ def setup_logging():
     return logging.getLogger(__name__)
 
 class RealDebridCachedUploader:
+    # Common video extensions; str.endswith takes the whole tuple and runs
+    # the comparison in C, so no per-file generator is needed
+    _VIDEO_EXTS = ('.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v')
+
     def __init__(self, api_key):
         self.api_key = api_key
         self.base_url = "https://api.real-debrid.com/rest/1.0"
@@ -30,34 +50,60 @@ class RealDebridCachedUploader:
             "User-Agent": "YTS-Scraper-Cached/1.0"
         }
         self.logger = setup_logging()
-        
-        # Rate limiting - more conservative for cache checking
-        self.rate_limit_delay = 1.0  # 1 second between requests
-        self.last_request_time = 0
-        self.cache_check_batch_size = 10  # Check 10 hashes at once
-        
+
+        # One pooled session for every API call: keep-alive skips the
+        # per-request TCP+TLS handshake, and transient errors retry at the
+        # transport layer. Everything targets a single host, so one pool
+        # sized for the worker-thread count is enough; gzip keeps the large
+        # instantAvailability responses small on the wire
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        retries = Retry(total=3, backoff_factor=0.5,
+                        status_forcelist=[429, 500, 502, 503, 504])
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=8,
+                                                   pool_block=True, max_retries=retries))
+
+        # Token-bucket rate limiting shared by all worker threads: short
+        # bursts may drain the bucket, but the long-run average stays at
+        # token_rate requests per second
+        self.token_rate = 1.0  # Requests per second
+        self.token_capacity = 5.0
+        self.tokens = self.token_capacity
+        self.last_refill_time = time.monotonic()
+        self.cache_check_batch_size = 50  # Hashes per instantAvailability request
+        self.cache_check_workers = 5  # Concurrent cache-check requests
+
+        # Serializes rate-limit bookkeeping across worker threads
+        self._rate_lock = threading.Lock()
+
     def _wait_for_rate_limit(self):
-        """Implement rate limiting between requests"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.rate_limit_delay:
-            wait_time = self.rate_limit_delay - time_since_last
+        """Take a token from the shared bucket, waiting for a refill if empty"""
+        while True:
+            with self._rate_lock:
+                now = time.monotonic()
+                self.tokens = min(self.token_capacity,
+                                  self.tokens + (now - self.last_refill_time) * self.token_rate)
+                self.last_refill_time = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait_time = (1 - self.tokens) / self.token_rate
+
             time.sleep(wait_time)
-        
-        self.last_request_time = time.time()
     
     def test_api_connection(self):
         """Test if the API key is valid"""
         try:
             self._wait_for_rate_limit()
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/user",
-                headers=self.headers,
                 timeout=10
             )
             if response.status_code == 200:
-                user_info = response.json()
+                user_info = _loads(response.content)
                 self.logger.info(f"✅ Connected to Real-Debrid as: {user_info.get('username', 'Unknown')}")
                 self.logger.info(f"📊 Premium days remaining: {user_info.get('premium', 0)}")
                 return True
@@ -68,30 +114,79 @@ class RealDebridCachedUploader:
             self.logger.error(f"❌ API connection error: {e}")
             return False
     
+    # Keep the '/'-joined hash path comfortably inside an 8KB request line
+    max_hash_path_length = 7500
+
+    def _pack_hashes(self, torrent_hashes):
+        """Greedily pack hashes into URL-length-bounded groups"""
+        packs = []
+        pack = []
+        pack_length = 0
+
+        for torrent_hash in torrent_hashes:
+            if pack and pack_length + len(torrent_hash) + 1 > self.max_hash_path_length:
+                packs.append(pack)
+                pack = []
+                pack_length = 0
+            pack.append(torrent_hash)
+            pack_length += len(torrent_hash) + 1
+
+        if pack:
+            packs.append(pack)
+        return packs
+
     def check_cache_availability(self, torrent_hashes):
-        """Check if torrents are cached on Real-Debrid (batch operation)"""
-        try:
-            self._wait_for_rate_limit()
-            
-            # Real-Debrid expects hashes separated by '/'
-            hash_string = '/'.join(torrent_hashes)
-            
-            response = requests.get(
-                f"{self.base_url}/torrents/instantAvailability/{hash_string}",
-                headers=self.headers,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                self.logger.error(f"❌ Cache check failed: {response.status_code}")
-                return {}
-                
-        except Exception as e:
-            self.logger.error(f"❌ Error checking cache availability: {e}")
-            return {}
+        """Check if torrents are cached on Real-Debrid (batch operation)
+
+        Returns (results, checked) where checked holds the hashes covered
+        by a successfully completed pack response. Hashes from failed
+        packs are absent, so callers can tell "confirmed not cached"
+        apart from "never actually checked".
+        """
+        results = {}
+        checked = set()
+
+        for pack in self._pack_hashes(torrent_hashes):
+            try:
+                self._wait_for_rate_limit()
+
+                # Real-Debrid expects hashes separated by '/'
+                hash_string = '/'.join(pack)
+
+                response = self.session.get(
+                    f"{self.base_url}/torrents/instantAvailability/{hash_string}",
+                    timeout=30
+                )
+
+                if response.status_code == 200:
+                    results.update(_loads(response.content))
+                    checked.update(pack)
+                else:
+                    self.logger.error(f"❌ Cache check failed: {response.status_code}")
+
+            except Exception as e:
+                self.logger.error(f"❌ Error checking cache availability: {e}")
+
+        return results, checked
     
+    def is_torrent_cached_fast(self, torrent_hash, cache_data):
+        """Boolean-only cache check that stops at the first qualifying video file
+
+        Unlike is_torrent_cached, this doesn't enumerate every variant, so
+        it's O(1)-ish on large cached torrents when the caller only needs
+        a yes/no answer.
+        """
+        torrent_info = cache_data.get(torrent_hash)
+        if not isinstance(torrent_info, dict):
+            return False
+
+        return any(
+            any(file_info.get('filename', '').lower().endswith(self._VIDEO_EXTS)
+                for file_info in (variant_info.get('files') or ()))
+            for variant_info in torrent_info.values()
+            if isinstance(variant_info, dict)
+        )
+
     def is_torrent_cached(self, torrent_hash, cache_data):
         """Check if a specific torrent hash is cached and has good quality files"""
         if torrent_hash not in cache_data:
@@ -102,29 +197,26 @@ class RealDebridCachedUploader:
         # Real-Debrid returns cache info for each quality/group
         cached_variants = []
         for variant_id, variant_info in torrent_info.items():
-            if isinstance(variant_info, dict):
-                # Check if this variant has files
-                files = variant_info.get('files', [])
-                if files:
-                    # Look for video files (common video extensions)
-                    video_extensions = ['.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v']
-                    video_files = []
-                    
-                    for file_info in files:
-                        filename = file_info.get('filename', '').lower()
-                        if any(filename.endswith(ext) for ext in video_extensions):
-                            video_files.append({
-                                'filename': file_info.get('filename'),
-                                'filesize': file_info.get('filesize', 0)
-                            })
-                    
-                    if video_files:
-                        cached_variants.append({
-                            'variant_id': variant_id,
-                            'video_files': video_files,
-                            'total_files': len(files)
-                        })
-        
+            if not isinstance(variant_info, dict):
+                continue
+
+            files = variant_info.get('files') or ()
+            # A comprehension keeps the per-file loop in C and touches each
+            # file dict once
+            video_files = [
+                {'filename': file_info.get('filename', ''),
+                 'filesize': file_info.get('filesize', 0)}
+                for file_info in files
+                if file_info.get('filename', '').lower().endswith(self._VIDEO_EXTS)
+            ]
+
+            if video_files:
+                cached_variants.append({
+                    'variant_id': variant_id,
+                    'video_files': video_files,
+                    'total_files': len(files)
+                })
+
         return len(cached_variants) > 0, cached_variants
     
     def upload_cached_magnet(self, magnet_link, movie_info):
@@ -137,25 +229,24 @@ class RealDebridCachedUploader:
             
             data = {'magnet': magnet_link}
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.base_url}/torrents/addMagnet",
-                headers=self.headers,
                 data=data,
                 timeout=30
             )
             
             if response.status_code == 201:
-                result = response.json()
+                result = _loads(response.content)
                 torrent_id = result.get('id')
                 self.logger.info(f"✅ Uploaded cached torrent: {movie_name} ({quality}) (ID: {torrent_id})")
                 return {'success': True, 'id': torrent_id, 'uri': result.get('uri')}
             else:
                 try:
-                    error_data = response.json()
+                    error_data = _loads(response.content)
                     error_msg = error_data.get('error', response.text)
                     self.logger.error(f"❌ Failed to upload {movie_name}: {error_msg}")
                     return {'success': False, 'error': error_msg}
-                except json.JSONDecodeError:
+                except ValueError:
                     self.logger.error(f"❌ Failed to upload {movie_name}: {response.text}")
                     return {'success': False, 'error': response.text}
                     
@@ -163,84 +254,100 @@ class RealDebridCachedUploader:
             self.logger.error(f"❌ Error uploading {movie_name}: {e}")
             return {'success': False, 'error': str(e)}
     
+    def upload_and_select(self, magnet_link, movie_info):
+        """Upload a cached magnet and chain the file selection in one task"""
+        result = self.upload_cached_magnet(magnet_link, movie_info)
+        if result['success']:
+            self.select_files(result['id'])
+        return result
+
     def select_files(self, torrent_id):
         """Select all files in a torrent for download"""
         try:
+            # The API accepts the 'all' shorthand, so there is no need to
+            # fetch the torrent info just to enumerate file IDs
             self._wait_for_rate_limit()
-            
-            # Get torrent info first
-            response = requests.get(
-                f"{self.base_url}/torrents/info/{torrent_id}",
-                headers=self.headers,
+            response = self.session.post(
+                f"{self.base_url}/torrents/selectFiles/{torrent_id}",
+                data={'files': 'all'},
                 timeout=10
             )
-            
-            if response.status_code == 200:
-                torrent_info = response.json()
-                files = torrent_info.get('files', [])
-                
-                if files:
-                    # Select all files
-                    file_ids = [str(f['id']) for f in files]
-                    data = {'files': ','.join(file_ids)}
-                    
-                    self._wait_for_rate_limit()
-                    select_response = requests.post(
-                        f"{self.base_url}/torrents/selectFiles/{torrent_id}",
-                        headers=self.headers,
-                        data=data,
-                        timeout=10
-                    )
-                    
-                    if select_response.status_code == 204:
-                        self.logger.info(f"📁 Selected {len(file_ids)} files for torrent {torrent_id}")
-                        return True
-                    else:
-                        self.logger.error(f"Failed to select files for torrent {torrent_id}")
-                        return False
-                else:
-                    self.logger.warning(f"No files found for torrent {torrent_id}")
-                    return True  # Still consider success if no files to select
+
+            if response.status_code == 204:
+                self.logger.info(f"📁 Selected all files for torrent {torrent_id}")
+                return True
+            elif response.status_code == 202:
+                # "Action already done" — files were auto-selected
+                self.logger.debug(f"📁 Files already selected for torrent {torrent_id}")
+                return True
             else:
-                self.logger.error(f"Failed to get torrent info for {torrent_id}")
+                self.logger.error(f"Failed to select files for torrent {torrent_id}")
                 return False
-                
+
         except Exception as e:
             self.logger.error(f"Error selecting files for torrent {torrent_id}: {e}")
             return False
 
 def find_magnet_files(directory):
-    """Find all .magnet files in the directory"""
-    magnet_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.magnet'):
-                magnet_files.append(os.path.join(root, file))
-    return magnet_files
+    """Yield (path, mtime) for every .magnet file under the directory"""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith('.magnet'):
+                        # DirEntry caches the stat result, so sorting by
+                        # mtime later needs no extra stat per file
+                        yield entry.path, entry.stat().st_mtime
+        except OSError as e:
+            logging.error(f"Error scanning {current}: {e}")
 
 def load_magnet_info(magnet_file_path):
     """Load magnet info from .magnet file"""
     try:
-        with open(magnet_file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Binary read: orjson wants bytes, and stdlib json accepts them too
+        with open(magnet_file_path, 'rb') as f:
+            return _loads(f.read())
     except Exception as e:
         logging.error(f"Error loading magnet file {magnet_file_path}: {e}")
         return None
 
-def extract_hash_from_magnet(magnet_link):
-    """Extract the torrent hash from a magnet link"""
+# Magnet links format: magnet:?xt=urn:btih:HASH&...
+# Info-hashes are either 40 hex characters or 32 base32 characters
+_HASH_RE = re.compile(r'xt=urn:btih:([A-Fa-f0-9]{40}|[A-Z2-7]{32})')
+
+# Persistent hash-state cache: uploaded hashes never need checking again,
+# and "not cached" hashes are only worth re-checking once in a while
+HASH_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rd_hash_cache.json')
+UNCACHED_RECHECK_SECONDS = 3600
+
+def load_hash_cache():
+    """Load the persistent hash -> {'state', 'ts'} cache"""
     try:
-        # Magnet links format: magnet:?xt=urn:btih:HASH&...
-        if 'xt=urn:btih:' in magnet_link:
-            start = magnet_link.find('xt=urn:btih:') + 12
-            end = magnet_link.find('&', start)
-            if end == -1:
-                hash_value = magnet_link[start:]
-            else:
-                hash_value = magnet_link[start:end]
-            return hash_value.upper()
+        if os.path.exists(HASH_CACHE_FILE):
+            with open(HASH_CACHE_FILE, 'rb') as f:
+                return _loads(f.read())
     except Exception as e:
-        logging.error(f"Error extracting hash from magnet link: {e}")
+        logging.warning(f"Could not load hash cache: {e}")
+    return {}
+
+def save_hash_cache(hash_cache):
+    """Save the persistent hash-state cache"""
+    try:
+        with open(HASH_CACHE_FILE, 'w') as f:
+            json.dump(hash_cache, f)
+    except Exception as e:
+        logging.warning(f"Could not save hash cache: {e}")
+
+def extract_hash_from_magnet(magnet_link):
+    """Extract the torrent hash from a magnet link"""
+    match = _HASH_RE.search(magnet_link)
+    if match:
+        return match.group(1).upper()
+    logging.error(f"No valid info-hash found in magnet link: {magnet_link[:60]}...")
     return None
 
 def main():
@@ -272,27 +379,32 @@ def main():
         logger.error("❌ Failed to connect to Real-Debrid API")
         sys.exit(1)
     
-    # Find magnet files
-    magnet_files = find_magnet_files(magnet_dir)
-    
-    if not magnet_files:
+    # Find magnet files along with their modification times
+    magnet_entries = list(find_magnet_files(magnet_dir))
+
+    if not magnet_entries:
         logger.info("📭 No .magnet files found to check")
         return
-    
-    # Sort by newest first
-    magnet_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-    
+
+    # Sort by newest first using the mtimes collected during the scan
+    magnet_entries.sort(key=lambda entry: entry[1], reverse=True)
+
     # Limit the number to check per run
-    if len(magnet_files) > max_uploads_per_run:
-        logger.info(f"🔍 Found {len(magnet_files)} magnet links, checking {max_uploads_per_run} for cache status")
-        magnet_files = magnet_files[:max_uploads_per_run]
+    if len(magnet_entries) > max_uploads_per_run:
+        logger.info(f"🔍 Found {len(magnet_entries)} magnet links, checking {max_uploads_per_run} for cache status")
+        magnet_entries = magnet_entries[:max_uploads_per_run]
     else:
-        logger.info(f"🔍 Found {len(magnet_files)} magnet links to check for cache status")
+        logger.info(f"🔍 Found {len(magnet_entries)} magnet links to check for cache status")
+
+    magnet_files = [path for path, _ in magnet_entries]
     
-    # Load magnet info and extract hashes
+    # Load magnet info on a thread pool — for thousands of tiny JSON files
+    # the wall time is open()/read() latency, not CPU — then extract hashes
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        magnet_infos = list(executor.map(load_magnet_info, magnet_files))
+
     magnet_data = []
-    for magnet_file in magnet_files:
-        magnet_info = load_magnet_info(magnet_file)
+    for magnet_file, magnet_info in zip(magnet_files, magnet_infos):
         if magnet_info and magnet_info.get('magnet_link'):
             torrent_hash = extract_hash_from_magnet(magnet_info['magnet_link'])
             if torrent_hash:
@@ -305,37 +417,103 @@ def main():
     if not magnet_data:
         logger.warning("⚠️  No valid magnet links found")
         return
-    
+
+    # Deduplicate by info-hash — the same movie saved more than once would
+    # otherwise pay for its cache check and upload per copy
+    unique_by_hash = {}
+    for item in magnet_data:
+        unique_by_hash.setdefault(item['hash'], item)
+
+    if len(unique_by_hash) < len(magnet_data):
+        logger.info(f"🔁 Skipping {len(magnet_data) - len(unique_by_hash)} duplicate magnet hashes")
+    magnet_data = list(unique_by_hash.values())
+
+    # Skip hashes already resolved in previous runs
+    hash_cache = load_hash_cache()
+    now = time.time()
+    already_uploaded = 0
+    recently_uncached = 0
+    remaining = []
+
+    for item in magnet_data:
+        cached_state = hash_cache.get(item['hash'])
+        if cached_state:
+            if cached_state.get('state') == 'uploaded':
+                already_uploaded += 1
+                continue
+            if (cached_state.get('state') == 'uncached'
+                    and now - cached_state.get('ts', 0) < UNCACHED_RECHECK_SECONDS):
+                recently_uncached += 1
+                continue
+        remaining.append(item)
+
+    if already_uploaded or recently_uncached:
+        logger.info(f"💾 Skipping {already_uploaded} already-uploaded and "
+                    f"{recently_uncached} recently-checked uncached torrents")
+    magnet_data = remaining
+
+    if not magnet_data:
+        logger.info("💾 All magnet links were already resolved in previous runs")
+        return
+
     logger.info(f"🔍 Checking cache status for {len(magnet_data)} torrents...")
     
-    # Check cache availability in batches
+    # Check cache availability in batches, fetching several batches
+    # concurrently — the work is all network round-trip latency
     cached_torrents = []
     uncached_torrents = []
-    
-    for i in range(0, len(magnet_data), uploader.cache_check_batch_size):
-        batch = magnet_data[i:i + uploader.cache_check_batch_size]
-        batch_hashes = [item['hash'] for item in batch]
-        
-        logger.info(f"🔍 Checking batch {i//uploader.cache_check_batch_size + 1}/{(len(magnet_data) + uploader.cache_check_batch_size - 1)//uploader.cache_check_batch_size}")
-        
-        cache_data = uploader.check_cache_availability(batch_hashes)
-        
+
+    batches = [magnet_data[i:i + uploader.cache_check_batch_size]
+               for i in range(0, len(magnet_data), uploader.cache_check_batch_size)]
+    total_batches = len(batches)
+
+    def check_batch(batch):
+        return uploader.check_cache_availability([item['hash'] for item in batch])
+
+    def classify_batch(batch_number, batch, cache_data, checked_hashes):
+        # One aggregate INFO line per batch; per-movie detail sits at DEBUG
+        # so a long run doesn't emit (and flush) a record per magnet.
+        # Lazy %-formatting skips building the message when the level is off
+        batch_cached = 0
+        debug_detail = logger.isEnabledFor(logging.DEBUG)
+
         for item in batch:
-            is_cached, variants = uploader.is_torrent_cached(item['hash'], cache_data)
-            
+            # Only walk every variant when the per-movie DEBUG lines that
+            # report them will actually be emitted
+            if debug_detail:
+                is_cached, variants = uploader.is_torrent_cached(item['hash'], cache_data)
+            else:
+                is_cached = uploader.is_torrent_cached_fast(item['hash'], cache_data)
+                variants = []
+            movie_name = item['magnet_info'].get('movie_name', 'Unknown')
+            quality = item['magnet_info'].get('quality', 'Unknown')
+
             if is_cached:
                 cached_torrents.append({
                     **item,
                     'variants': variants
                 })
-                movie_name = item['magnet_info'].get('movie_name', 'Unknown')
-                quality = item['magnet_info'].get('quality', 'Unknown')
-                logger.info(f"✅ CACHED: {movie_name} ({quality}) - {len(variants)} variant(s)")
+                batch_cached += 1
+                logger.debug('✅ CACHED: %s (%s) - %d variant(s)', movie_name, quality, len(variants))
             else:
                 uncached_torrents.append(item)
-                movie_name = item['magnet_info'].get('movie_name', 'Unknown')
-                quality = item['magnet_info'].get('quality', 'Unknown')
-                logger.info(f"❌ NOT CACHED: {movie_name} ({quality})")
+                # Only persist 'uncached' when the API actually answered
+                # for this hash; a failed pack must not suppress the next
+                # run's re-check
+                if item['hash'] in checked_hashes:
+                    hash_cache[item['hash']] = {'state': 'uncached', 'ts': now}
+                logger.debug('❌ NOT CACHED: %s (%s)', movie_name, quality)
+
+        logger.info('🔍 Batch %d/%d: %d cached, %d uncached',
+                    batch_number, total_batches, batch_cached, len(batch) - batch_cached)
+
+    # Consume the results lazily so each batch's cache_data — potentially
+    # hundreds of KB of nested file listings — is released right after
+    # classification instead of all batches being held in memory at once
+    with ThreadPoolExecutor(max_workers=uploader.cache_check_workers) as executor:
+        batch_results = zip(batches, executor.map(check_batch, batches))
+        for batch_number, (batch, (cache_data, checked_hashes)) in enumerate(batch_results, 1):
+            classify_batch(batch_number, batch, cache_data, checked_hashes)
     
     # Summary of cache check
     logger.info(f"\n📊 Cache Check Results:")
@@ -345,6 +523,7 @@ def main():
     
     if not cached_torrents:
         logger.info("💡 No cached torrents found. Try again later as cache status can change.")
+        save_hash_cache(hash_cache)
         return
     
     # Upload only cached torrents
@@ -352,23 +531,27 @@ def main():
     
     successful_uploads = 0
     failed_uploads = 0
-    
-    for i, torrent_data in enumerate(cached_torrents, 1):
+
+    def upload_task(torrent_data):
         magnet_info = torrent_data['magnet_info']
-        magnet_link = magnet_info['magnet_link']
-        movie_name = magnet_info.get('movie_name', 'Unknown')
-        quality = magnet_info.get('quality', 'Unknown')
-        
-        logger.info(f"📤 Uploading ({i}/{len(cached_torrents)}): {movie_name} ({quality})")
-        result = uploader.upload_cached_magnet(magnet_link, magnet_info)
-        
-        if result['success']:
-            successful_uploads += 1
-            # Auto-select files for download
-            torrent_id = result['id']
-            uploader.select_files(torrent_id)
-        else:
-            failed_uploads += 1
+        return torrent_data, uploader.upload_and_select(magnet_info['magnet_link'], magnet_info)
+
+    # A few workers let the next addMagnet overlap the previous torrent's
+    # selectFiles call while the rate limiter still caps the overall pace
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        for i, (torrent_data, result) in enumerate(executor.map(upload_task, cached_torrents), 1):
+            magnet_info = torrent_data['magnet_info']
+            movie_name = magnet_info.get('movie_name', 'Unknown')
+            quality = magnet_info.get('quality', 'Unknown')
+            logger.info('📤 Processed (%d/%d): %s (%s)', i, len(cached_torrents), movie_name, quality)
+
+            if result['success']:
+                successful_uploads += 1
+                hash_cache[torrent_data['hash']] = {'state': 'uploaded', 'ts': time.time()}
+            else:
+                failed_uploads += 1
+
+    save_hash_cache(hash_cache)
     
     # Final summary
     logger.info(f"\n📊 Final Summary:")
@@ -5,68 +5,232 @@ Uploads torrents to Real-Debrid with intelligent rate limiting and error handlin
 """
 
 import os
+import re
 import sys
+import socket
+import hashlib
 import json
+import heapq
+import operator
 import requests
 import logging
 import time
+import threading
+import random
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 
-def setup_logging():
-    """Setup logging for Real-Debrid upload"""
+# orjson is an optional speedup for the many small JSON documents this
+# script parses; fall back transparently to the stdlib when not installed
+try:
+    import orjson
+
+    def _loads(data):
+        return orjson.loads(data)
+except ImportError:
+    def _loads(data):
+        return json.loads(data)
+
+# Info-hash inside a magnet URI: 40-char hex or 32-char base32
+_HASH_RE = re.compile(r'btih:([0-9a-fA-F]{40}|[A-Z2-7]{32})')
+
+# A verified API key stays valid for a day before we re-check it; the
+# warm-up GET /user otherwise costs a round trip on every scheduled run
+AUTH_CACHE_FILE = os.path.expanduser('~/.yts_rd_auth.json')
+AUTH_CACHE_TTL = 24 * 3600
+
+# Parsed magnet metadata from previous runs, keyed by path; an entry is
+# valid while the file's mtime_ns is unchanged, so steady-state runs
+# only parse newly written files
+MAGNET_INDEX_FILE = os.path.expanduser('~/.yts_magnet_index.json')
+
+def load_magnet_index():
+    """Load the path -> parsed-magnet-metadata index"""
+    try:
+        with open(MAGNET_INDEX_FILE, 'rb') as f:
+            return _loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+def save_magnet_index(index):
+    """Persist the parsed-magnet-metadata index"""
+    try:
+        with open(MAGNET_INDEX_FILE, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+    except OSError as e:
+        logging.warning(f"Could not save magnet index: {e}")
+
+# Hashes already uploaded in previous runs; skipping them saves a
+# rate-limited round trip the API would reject as a duplicate anyway
+SEEN_HASHES_FILE = os.path.expanduser('~/.yts_seen_hashes.json')
+
+def _extract_info_hash(magnet_link):
+    match = _HASH_RE.search(magnet_link)
+    return match.group(1).lower() if match else None
+
+def load_seen_hashes():
+    """Load the set of info-hashes uploaded in previous runs"""
+    try:
+        with open(SEEN_HASHES_FILE, 'rb') as f:
+            return set(_loads(f.read()))
+    except (OSError, ValueError):
+        return set()
+
+def save_seen_hashes(seen_hashes):
+    """Persist the set of uploaded info-hashes"""
+    try:
+        with open(SEEN_HASHES_FILE, 'w', encoding='utf-8') as f:
+            json.dump(sorted(seen_hashes), f)
+    except OSError as e:
+        logging.warning(f"Could not save seen-hash cache: {e}")
+
+class _KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter that enables TCP keep-alive on its pooled sockets"""
+
+    _SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Linux-only probe intervals; keep the adapter portable elsewhere
+    if hasattr(socket, 'TCP_KEEPIDLE'):
+        _SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 30))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        _SOCKET_OPTIONS.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 15))
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = self._SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+# Configure logging once at import; per-instance setup_logging() calls
+# were no-ops after the first but still took the logging lock
+if not logging.getLogger().handlers:
     logging.basicConfig(
         level=logging.INFO,
         format='%(asctime)s - %(levelname)s - %(message)s'
     )
-    return logging.getLogger(__name__)
+_LOGGER = logging.getLogger(__name__)
 
 class RealDebridSmartUploader:
+    # Constant request body for selectFiles, built once instead of per call
+    _SELECT_ALL_DATA = {'files': 'all'}
+
     def __init__(self, api_key):
         self.api_key = api_key
         self.base_url = "https://api.real-debrid.com/rest/1.0"
-        self.headers = {
+        self.logger = _LOGGER
+
+        # One pooled session carries every API call, so the TCP+TLS
+        # handshake happens once instead of per request. A single blocking
+        # connection suffices for this mostly-serial, single-host script,
+        # and TCP keep-alive stops idle rate-limit waits from dropping it.
+        # Default headers are set once here and merged by the session;
+        # gzip keeps the JSON responses small on the wire
+        self.session = requests.Session()
+        self.session.headers.update({
             "Authorization": f"Bearer {api_key}",
-            "User-Agent": "YTS-Scraper-Smart/1.0"
-        }
-        self.logger = setup_logging()
-        
-        # Conservative rate limiting to avoid 403 errors
-        self.rate_limit_delay = 3.0  # 3 seconds between requests
-        self.last_request_time = 0
+            "User-Agent": "YTS-Scraper-Smart/1.0",
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive",
+        })
+        self.session.mount(
+            "https://",
+            _KeepAliveAdapter(pool_connections=1, pool_maxsize=1, pool_block=True)
+        )
+
+        # Token-bucket rate limiting: short bursts draw from the bucket,
+        # the refill rate caps the long-run average at ~1 request / 3s
+        self.capacity = 5.0
+        self.refill_rate = 1 / 3.0
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        # The background selectFiles worker shares the bucket with the
+        # main upload thread, so its bookkeeping is serialized
+        self._rate_lock = threading.Lock()
         self.max_retries = 2
-        self.backoff_delay = 30  # Wait 30s on rate limit errors
+        # Decorrelated-jitter retry delay; grows on errors, resets on success
+        self._backoff = 1.0
         
+    def _refill_tokens(self):
+        # Caller must hold _rate_lock
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+        self.last_refill = now
+
     def _wait_for_rate_limit(self):
-        """Implement rate limiting between requests"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        
-        if time_since_last < self.rate_limit_delay:
-            wait_time = self.rate_limit_delay - time_since_last
+        """Take a token from the bucket, sleeping until one is available"""
+        while True:
+            with self._rate_lock:
+                self._refill_tokens()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.refill_rate
             time.sleep(wait_time)
-        
-        self.last_request_time = time.time()
-    
+
+    def _handle_rate_limit_error(self):
+        """Slow the bucket down after a rate-limit or quota error"""
+        with self._rate_lock:
+            self.refill_rate = max(1 / 30.0, self.refill_rate / 2)
+            self.tokens = 0.0
+
+    def _next_backoff(self, retry_after=0.0):
+        """Decorrelated jitter: spreads retries out without a fixed delay"""
+        self._backoff = min(60.0, random.uniform(1.0, self._backoff * 3))
+        return max(retry_after, self._backoff)
+
+    def close(self):
+        """Release the pooled connections"""
+        self.session.close()
+
+    def _api_key_hash(self):
+        return hashlib.sha256(self.api_key.encode('utf-8')).hexdigest()[:16]
+
+    def _load_cached_auth(self):
+        try:
+            with open(AUTH_CACHE_FILE, 'rb') as f:
+                cached = _loads(f.read())
+        except (OSError, ValueError):
+            return None
+        if cached.get('api_key_hash') != self._api_key_hash():
+            return None
+        if time.time() - cached.get('verified_at', 0) > AUTH_CACHE_TTL:
+            return None
+        return cached
+
+    def _save_cached_auth(self, username):
+        try:
+            with open(AUTH_CACHE_FILE, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'api_key_hash': self._api_key_hash(),
+                    'username': username,
+                    'verified_at': time.time(),
+                }, f)
+        except OSError as e:
+            self.logger.warning("Could not save auth cache: %s", e)
+
     def test_api_connection(self):
         """Test if the API key is valid"""
+        cached = self._load_cached_auth()
+        if cached:
+            self.logger.info("✅ Using cached Real-Debrid auth for: %s", cached.get('username', 'Unknown'))
+            return True
         try:
             self._wait_for_rate_limit()
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/user",
-                headers=self.headers,
                 timeout=10
             )
             if response.status_code == 200:
-                user_info = response.json()
-                self.logger.info(f"✅ Connected to Real-Debrid as: {user_info.get('username', 'Unknown')}")
-                self.logger.info(f"📊 Premium days remaining: {user_info.get('premium', 0)}")
+                user_info = _loads(response.content)
+                self.logger.info("✅ Connected to Real-Debrid as: %s", user_info.get('username', 'Unknown'))
+                self.logger.info("📊 Premium days remaining: %s", user_info.get('premium', 0))
+                self._save_cached_auth(user_info.get('username', 'Unknown'))
                 return True
             else:
-                self.logger.error(f"❌ API connection failed: {response.status_code}")
+                self.logger.error("❌ API connection failed: %s", response.status_code)
                 return False
         except Exception as e:
-            self.logger.error(f"❌ API connection error: {e}")
+            self.logger.error("❌ API connection error: %s", e)
             return False
     
     def upload_magnet(self, magnet_link, movie_info):
@@ -80,117 +244,136 @@ class RealDebridSmartUploader:
                 
                 data = {'magnet': magnet_link}
                 
-                response = requests.post(
+                response = self.session.post(
                     f"{self.base_url}/torrents/addMagnet",
-                    headers=self.headers,
                     data=data,
                     timeout=30
                 )
                 
                 if response.status_code == 201:
-                    result = response.json()
+                    self._backoff = 1.0
+                    result = _loads(response.content)
                     torrent_id = result.get('id')
-                    self.logger.info(f"✅ Uploaded: {movie_name} ({quality}) (ID: {torrent_id})")
-                    return {'success': True, 'id': torrent_id, 'uri': result.get('uri')}
+                    self.logger.info("✅ Uploaded: %s (%s) (ID: %s)", movie_name, quality, torrent_id)
+                    return {'success': True, 'category': 'ok', 'id': torrent_id, 'uri': result.get('uri')}
                 else:
                     try:
-                        error_data = response.json()
+                        error_data = _loads(response.content)
                         error_code = error_data.get('error_code')
                         error_msg = error_data.get('error', response.text)
                         
                         # Handle specific error codes
                         if error_code in [34, 21]:  # Rate limit or too many downloads
+                            self._handle_rate_limit_error()
                             if attempt < self.max_retries - 1:
-                                self.logger.warning(f"⏳ Rate limit/quota hit for {movie_name}. Waiting {self.backoff_delay}s...")
-                                time.sleep(self.backoff_delay)
+                                try:
+                                    retry_after = float(response.headers.get('Retry-After', 0))
+                                except (TypeError, ValueError):
+                                    retry_after = 0.0
+                                wait = self._next_backoff(retry_after)
+                                self.logger.warning("⏳ Rate limit/quota hit for %s. Backing off %.1fs...", movie_name, wait)
+                                time.sleep(wait)
                                 continue
                         
-                        self.logger.error(f"❌ Failed to upload {movie_name}: {error_msg}")
-                        return {'success': False, 'error': error_msg, 'error_code': error_code}
+                        if error_code == 34:
+                            category = 'rate_limited'
+                        elif error_code == 21:
+                            category = 'quota'
+                        elif response.status_code >= 500:
+                            # Server-side failure: counts toward the breaker
+                            category = 'network'
+                        else:
+                            category = 'bad_input'
+                        self.logger.error("❌ Failed to upload %s: %s", movie_name, error_msg)
+                        return {'success': False, 'category': category, 'error': error_msg, 'error_code': error_code}
                         
-                    except json.JSONDecodeError:
+                    except ValueError:
+                        # Non-JSON bodies on 5xx are server error pages,
+                        # not a problem with the submitted magnet
+                        category = 'network' if response.status_code >= 500 else 'bad_input'
                         error_msg = response.text
-                        self.logger.error(f"❌ Failed to upload {movie_name}: {error_msg}")
-                        return {'success': False, 'error': error_msg}
+                        self.logger.error("❌ Failed to upload %s: %s", movie_name, error_msg)
+                        return {'success': False, 'category': category, 'error': error_msg}
                         
             except Exception as e:
                 if attempt < self.max_retries - 1:
-                    self.logger.warning(f"⚠️  Error uploading {movie_name} (attempt {attempt + 1}): {e}")
-                    time.sleep(10)
+                    self.logger.warning("⚠️  Error uploading %s (attempt %d): %s", movie_name, attempt + 1, e)
+                    time.sleep(self._next_backoff())
                     continue
                 else:
-                    self.logger.error(f"❌ Error uploading {movie_name}: {e}")
-                    return {'success': False, 'error': str(e)}
+                    self.logger.error("❌ Error uploading %s: %s", movie_name, e)
+                    return {'success': False, 'category': 'network', 'error': str(e)}
         
-        return {'success': False, 'error': 'Max retries exceeded'}
+        return {'success': False, 'category': 'rate_limited', 'error': 'Max retries exceeded'}
     
     def select_files(self, torrent_id):
         """Select all files in a torrent for download"""
         try:
             self._wait_for_rate_limit()
             
-            # Get torrent info first
-            response = requests.get(
-                f"{self.base_url}/torrents/info/{torrent_id}",
-                headers=self.headers,
+            # 'all' is the documented wildcard, so there's no need to GET
+            # the torrent info first just to enumerate file ids
+            response = self.session.post(
+                f"{self.base_url}/torrents/selectFiles/{torrent_id}",
+                data=self._SELECT_ALL_DATA,
                 timeout=10
             )
             
-            if response.status_code == 200:
-                torrent_info = response.json()
-                files = torrent_info.get('files', [])
-                
-                if files:
-                    # Select all files
-                    file_ids = [str(f['id']) for f in files]
-                    data = {'files': ','.join(file_ids)}
-                    
-                    self._wait_for_rate_limit()
-                    select_response = requests.post(
-                        f"{self.base_url}/torrents/selectFiles/{torrent_id}",
-                        headers=self.headers,
-                        data=data,
-                        timeout=10
-                    )
-                    
-                    if select_response.status_code == 204:
-                        self.logger.info(f"📁 Selected {len(file_ids)} files for torrent {torrent_id}")
-                        return True
-                    else:
-                        self.logger.warning(f"Failed to select files for torrent {torrent_id}")
-                        return False
-                else:
-                    self.logger.info(f"No files to select for torrent {torrent_id}")
-                    return True
+            # 202 means the action was already done (single-file torrents
+            # are auto-selected on add)
+            if response.status_code in (204, 202):
+                self.logger.info("📁 Selected files for torrent %s", torrent_id)
+                return True
             else:
-                self.logger.warning(f"Failed to get torrent info for {torrent_id}")
+                self.logger.warning("Failed to select files for torrent %s", torrent_id)
                 return False
                 
         except Exception as e:
-            self.logger.error(f"Error selecting files for torrent {torrent_id}: {e}")
+            self.logger.error("Error selecting files for torrent %s: %s", torrent_id, e)
             return False
 
+def _iter_magnet_files(directory):
+    # DirEntry.is_file/is_dir reuse the type cached by readdir, and the
+    # mtime comes from the same DirEntry so sorting needs no re-stat
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith('.magnet'):
+                yield entry.path, entry.stat().st_mtime_ns
+            elif entry.is_dir(follow_symlinks=False):
+                yield from _iter_magnet_files(entry.path)
+
 def find_magnet_files(directory):
-    """Find all .magnet files in the directory"""
-    magnet_files = []
-    for root, dirs, files in os.walk(directory):
-        for file in files:
-            if file.endswith('.magnet'):
-                magnet_files.append(os.path.join(root, file))
-    return magnet_files
+    """Find all .magnet files with their mtimes as (path, st_mtime_ns)"""
+    return list(_iter_magnet_files(directory))
+
+# The scraper writes these fields as flat, escape-free JSON strings, so
+# they can usually be pulled from the raw bytes without a full parse.
+# [^"\\] rejects escaped values, pushing those to the JSON fallback
+_FAST_FIELD_RES = {
+    field: re.compile(br'"' + field.encode() + br'"\s*:\s*"([^"\\]*)"')
+    for field in ('magnet_link', 'movie_name', 'quality')
+}
 
 def load_magnet_info(magnet_file_path):
     """Load magnet info from .magnet file"""
     try:
-        with open(magnet_file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(magnet_file_path, 'rb') as f:
+            data = f.read()
+        info = {}
+        for field, pattern in _FAST_FIELD_RES.items():
+            match = pattern.search(data)
+            if match is None:
+                # Unusual shape or escapes — parse the whole document
+                return _loads(data)
+            info[field] = match.group(1).decode('utf-8')
+        return info
     except Exception as e:
         logging.error(f"Error loading magnet file {magnet_file_path}: {e}")
         return None
 
 def main():
     """Main function - smart upload with rate limiting"""
-    logger = setup_logging()
+    logger = _LOGGER
     
     # Get environment variables
     api_key = os.environ.get('REAL_DEBRID_API_KEY')
@@ -220,23 +403,56 @@ def main():
         logger.info("📭 No .magnet files found to upload")
         return
     
-    # Sort by newest first
-    magnet_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-    
-    # Limit uploads to avoid overwhelming Real-Debrid
+    # Keep only the newest files, limited to avoid overwhelming
+    # Real-Debrid; a top-K heap selection beats sorting the whole scan
     if len(magnet_files) > max_uploads_per_run:
-        logger.info(f"🔍 Found {len(magnet_files)} magnet files, uploading {max_uploads_per_run} per run")
-        magnet_files = magnet_files[:max_uploads_per_run]
+        logger.info("🔍 Found %d magnet files, uploading %d per run", len(magnet_files), max_uploads_per_run)
     else:
-        logger.info(f"🔍 Found {len(magnet_files)} magnet files to upload")
+        logger.info("🔍 Found %d magnet files to upload", len(magnet_files))
+    magnet_files = heapq.nlargest(max_uploads_per_run, magnet_files, key=operator.itemgetter(1))
     
+    # Pre-load magnet JSON so the upload loop below only spends its time
+    # on (rate-limited) network I/O. Files whose mtime matches the index
+    # reuse the previous run's parse; only new/changed ones hit the disk
+    magnet_index = load_magnet_index()
+    magnet_infos = [None] * len(magnet_files)
+    to_load = []
+    for idx, (path, mtime_ns) in enumerate(magnet_files):
+        entry = magnet_index.get(path)
+        if entry and entry.get('mtime_ns') == mtime_ns:
+            magnet_infos[idx] = entry
+        else:
+            to_load.append(idx)
+    if to_load:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            loaded = list(executor.map(load_magnet_info, [magnet_files[idx][0] for idx in to_load]))
+        for idx, info in zip(to_load, loaded):
+            magnet_infos[idx] = info
+            if info:
+                path, mtime_ns = magnet_files[idx]
+                magnet_index[path] = {
+                    'mtime_ns': mtime_ns,
+                    'movie_name': info.get('movie_name'),
+                    'quality': info.get('quality'),
+                    'magnet_link': info.get('magnet_link'),
+                }
+    save_magnet_index(magnet_index)
+
+    # selectFiles always targets the previous torrent, so it can run on a
+    # background worker and overlap the next upload's rate-limit wait
+    select_pool = ThreadPoolExecutor(max_workers=1)
+
+    seen_hashes = load_seen_hashes()
+    skipped_duplicates = 0
+    # Cached once: skips per-movie formatting entirely when INFO is off
+    log_info_enabled = logger.isEnabledFor(logging.INFO)
+
     # Upload magnets with smart rate limiting
     successful_uploads = 0
     failed_uploads = 0
     consecutive_failures = 0
     
-    for i, magnet_file in enumerate(magnet_files, 1):
-        magnet_info = load_magnet_info(magnet_file)
+    for i, magnet_info in enumerate(magnet_infos, 1):
         if not magnet_info or not magnet_info.get('magnet_link'):
             failed_uploads += 1
             continue
@@ -244,30 +460,54 @@ def main():
         movie_name = magnet_info.get('movie_name', 'Unknown')
         quality = magnet_info.get('quality', 'Unknown')
         
-        logger.info(f"📤 Uploading ({i}/{len(magnet_files)}): {movie_name} ({quality})")
+        info_hash = _extract_info_hash(magnet_info['magnet_link'])
+        if info_hash and info_hash in seen_hashes:
+            skipped_duplicates += 1
+            continue
+        
+        if log_info_enabled:
+            logger.info("📤 Uploading (%d/%d): %s (%s)", i, len(magnet_files), movie_name, quality)
         result = uploader.upload_magnet(magnet_info['magnet_link'], magnet_info)
         
         if result['success']:
             successful_uploads += 1
             consecutive_failures = 0
+            if info_hash:
+                seen_hashes.add(info_hash)
             # Auto-select files for download
-            torrent_id = result['id']
-            uploader.select_files(torrent_id)
+            select_pool.submit(uploader.select_files, result['id'])
         else:
             failed_uploads += 1
-            consecutive_failures += 1
+            category = result.get('category', 'network')
             
-            # Stop if too many consecutive failures (likely rate limited)
-            if consecutive_failures >= 5:
-                logger.warning(f"⏸️  Too many consecutive failures ({consecutive_failures}). Stopping to avoid rate limits.")
-                logger.info(f"💡 Remaining {len(magnet_files) - i} files will be processed in next run.")
+            if category == 'bad_input':
+                # A rejected magnet is a per-file problem, not an API-health
+                # signal — it shouldn't count toward the breaker
+                consecutive_failures = 0
+            elif category in ('rate_limited', 'quota'):
+                # upload_magnet already retried through the backoff once;
+                # anything further just burns rate-limited round trips
+                logger.warning("⏸️  API reported %s. Stopping this run.", category)
+                logger.info("💡 Remaining %d files will be processed in next run.", len(magnet_files) - i)
                 break
+            else:
+                consecutive_failures += 1
+                if consecutive_failures >= 5:
+                    logger.warning("⏸️  Too many consecutive network failures (%d). Stopping.", consecutive_failures)
+                    logger.info("💡 Remaining %d files will be processed in next run.", len(magnet_files) - i)
+                    break
     
+    select_pool.shutdown(wait=True)
+    uploader.close()
+    save_seen_hashes(seen_hashes)
+
     # Final summary
     logger.info(f"\n📊 Upload Summary:")
     logger.info(f"   ✅ Successful: {successful_uploads}")
     logger.info(f"   ❌ Failed: {failed_uploads}")
     logger.info(f"   📁 Total processed: {successful_uploads + failed_uploads}")
+    if skipped_duplicates:
+        logger.info(f"   ⏭️  Skipped (already uploaded): {skipped_duplicates}")
     
     if successful_uploads > 0:
         logger.info(f"🎉 {successful_uploads} movies are now available in Real-Debrid!")